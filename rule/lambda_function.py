@@ -2,14 +2,21 @@ import boto3
 import botocore
 # import jsonschema
 import json
+import random
 import traceback
-import zipfile
-import os
-import subprocess
 import logging
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# orjson is optional, the standard library json module is used when it isn't packaged with the Lambda
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from extutil import remove_none_attributes, account_context, ExtensionHandler, ext, \
     current_epoch_time_usec_num, component_safe_name, lambda_env, random_id, \
     handle_common_errors
@@ -17,11 +24,114 @@ from extutil import remove_none_attributes, account_context, ExtensionHandler, e
 eh = ExtensionHandler()
 
 # Import your clients
-client = boto3.client('events')
+# Built once at import so warm invocations reuse the client and its connection pool.
+# Adaptive retry mode gives throttled and 5xx calls (e.g. InternalException) exponential
+# backoff with jitter inside the SDK, instead of re-invoking the whole Lambda
+CLIENT_CONFIG = Config(
+    retries={'total_max_attempts': 4, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    connect_timeout=3,
+    read_timeout=10
+)
+SESSION = boto3.session.Session()
+client = SESSION.client('events', config=CLIENT_CONFIG)
+
+# ConcurrentModificationException is a 400, which the SDK does not retry on its own.
+# Short conflicts are absorbed here; once these attempts run out, the ops fall back to retry_with_jitter
+IN_PROCESS_RETRY_CODES = frozenset({"ConcurrentModificationException", "InternalException"})
+# total_max_attempts counts the first request too, so this is the number of calls the hook allows as well
+MAX_IN_PROCESS_ATTEMPTS = CLIENT_CONFIG.retries["total_max_attempts"]
+
+def retry_transient_errors(response, attempts, **kwargs):
+    # needs-retry hook: returning a number of seconds makes botocore sleep and resend the request
+    if response is None or attempts >= MAX_IN_PROCESS_ATTEMPTS:
+        return None
+    if response[1].get("Error", {}).get("Code") in IN_PROCESS_RETRY_CODES:
+        return random.uniform(0, min(2, 0.05 * 2 ** attempts))
+    return None
+
+client.meta.events.register(f"needs-retry.{client.meta.service_model.service_id.hyphenize()}", retry_transient_errors)
+
+# Modeled EventBridge errors, looked up once instead of through client.exceptions in every except clause
+ConcurrentModificationException = client.exceptions.ConcurrentModificationException
+InternalException = client.exceptions.InternalException
+InvalidEventPatternException = client.exceptions.InvalidEventPatternException
+LimitExceededException = client.exceptions.LimitExceededException
+ManagedRuleException = client.exceptions.ManagedRuleException
+ResourceNotFoundException = client.exceptions.ResourceNotFoundException
+
+# Modeled errors that permanently fail a rule or target operation, and what to tell the user about them
+RULE_ERROR_MESSAGES = {
+    InvalidEventPatternException: "The event pattern specified is invalid. Please check your event pattern and try again.",
+    LimitExceededException: "AWS Quota for EventBridge Rules/Targets reached. Please increase your quota and try again.",
+    ManagedRuleException: "This rule was created by an AWS service on behalf of your account. It is managed by that service and editing or deleting it is restricted.",
+    ResourceNotFoundException: "Rule Not Found"
+}
+RULE_ERRORS = tuple(RULE_ERROR_MESSAGES)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Sentinel for dict lookups where None is a meaningful value
+MISSING = object()
+
+# The statement added to SNS topic policies, apart from its Resource
+SNS_BASE_STATEMENT = {
+    "Sid": "PublishEventsToMyTopic",
+    "Effect": "Allow",
+    "Principal": {
+        "Service": "events.amazonaws.com"
+    },
+    "Action": "sns:Publish"
+}
+
+# Returned by the permission helpers when the target's policy already has the rule's statement
+POLICY_CURRENT = object()
+
+# Rule attributes that are not sent to put_rule on create / on update, and not compared against describe_rule
+CREATE_EXCLUDE = frozenset({"Targets"})
+UPDATE_EXCLUDE = frozenset({"Tags", "Targets"})
+
+# Console link for a rule, filled in by gen_rule_link
+RULE_LINK_TEMPLATE = "https://{region}.console.aws.amazon.com/events/home?region={region}#/eventbus/{event_bus_name}/rules/{rule_name}"
+
+# PutTargets and RemoveTargets accept at most 100 entries per call
+MAX_TARGETS_PER_CALL = 100
+
+# put_targets entry error codes that are worth retrying
+PUT_TARGETS_RETRY_CODES = frozenset({"ResourceNotFoundException", "InternalException", "ConcurrentModificationException", "LimitExceededException"})
+
+# (put_targets key, component definition key) pairs used by format_target
+SIMPLE_FIELDS = (("Id", "id"), ("Arn", "arn"), ("RoleArn", "role_arn"), ("Input", "input"), ("InputPath", "input_path"))
+HTTP_FIELDS = (("PathParameterValues", "http_path_parameter_values"), ("HeaderParameters", "http_header_parameters"), ("QueryStringParameters", "http_query_string_parameters"))
+RETRY_FIELDS = (("MaximumRetryAttempts", "maximum_retry_attempts"), ("MaximumEventAgeInSeconds", "maximum_event_age_in_seconds"))
+HTTP_KEYS = frozenset(item_key for _, item_key in HTTP_FIELDS)
+RETRY_KEYS = frozenset(item_key for _, item_key in RETRY_FIELDS)
+
+# Target services that need a resource policy statement for the rule, and the op that adds it
+TARGET_PERMISSION_OPS = {
+    "lambda": "add_lambda_permissions",
+    "sns": "add_sns_permissions",
+    "sqs": "add_sqs_permissions"
+}
+
+# Shared by every op for the lifetime of the container, so warm invocations don't spawn new threads
+POOL_MAX_WORKERS = 16
+POOL = ThreadPoolExecutor(max_workers=POOL_MAX_WORKERS, thread_name_prefix="eventbridge")
+
+# The permission ops call their target's service from every pool thread at once, so size the connection pool to match
+PERMISSION_CLIENT_CONFIG = Config(
+    retries={'total_max_attempts': 4, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    max_pool_connections=POOL_MAX_WORKERS,
+    connect_timeout=3,
+    read_timeout=10
+)
+lambda_client = SESSION.client("lambda", config=PERMISSION_CLIENT_CONFIG)
+sns_client = SESSION.client("sns", config=PERMISSION_CLIENT_CONFIG)
+sqs_client = SESSION.client("sqs", config=PERMISSION_CLIENT_CONFIG)
+
 """
 eh calls
     eh.add_op() call MUST be made for the function to execute! Adds functions to the execution queue.
@@ -54,12 +164,51 @@ def safe_cast(val, to_type, default=None):
         return default
     
 
+# If upserting, we start with the GET STATE call
+def setup_upsert(prev_state, name):
+    old_name = prev_state.get("props", {}).get("name")
+
+    # Without a previous rule there is no state to get, so go straight to creating it
+    if old_name:
+        eh.add_op("get_rule")
+    else:
+        eh.add_op("create_rule")
+
+    # If any non-editable fields have changed, we are choosing to fail. 
+    # We are NOT choosing to delete and recreate the rule
+    if (old_name and old_name != name):
+
+        non_editable_error_message = "You may not edit the name of the existing rule. Please create a new component with the desired name."
+        eh.add_log("Cannot edit non-editable field", {"error": non_editable_error_message}, is_error=True)
+        eh.perm_error(non_editable_error_message, 10)
+
+
+# If deleting, we start with the DELETE call 
+#   (sometimes you start with GET STATE if you need to make a call for the identifier)
+def setup_delete(prev_state, name):
+    existing_rule_name = prev_state.get("props", {}).get("name")
+    if existing_rule_name:
+        eh.add_op("delete_rule")
+        eh.add_state({"name": existing_rule_name})
+    else:
+        missing_name_error_message = "Cannot delete the rule because its name is missing from the previous state."
+        eh.add_log("Rule Name Not Found", {"error": missing_name_error_message}, is_error=True)
+        eh.perm_error(missing_name_error_message, 0)
+
+
+OP_SETUPS = {
+    "upsert": setup_upsert,
+    "delete": setup_delete
+}
+
+
 def lambda_handler(event, context):
     try:
         # All relevant data is generally in the event, excepting the region and account number
         print(f"event = {event}")
-        region = account_context(context)['region']
-        account_number = account_context(context)['number']
+        context_info = account_context(context)
+        region = context_info['region']
+        account_number = context_info['number']
 
         # This copies the operations, props, links, retry data, and remaining operations that are sent from CloudKommand. 
         # Just always include this.
@@ -91,17 +240,17 @@ def lambda_handler(event, context):
         role_arn = cdef.get("role_arn") or None
         tags = cdef.get('tags') # this is converted to a [{"Key": key, "Value": value} , ...] format
 
-        targets = cdef.get("targets") or []
+        targets = cdef.get("targets") or {}
 
         # remove any None values from the attributes dictionary        
         attributes = remove_none_attributes({
-            "Name": str(name) if name else name,
+            "Name": name,
             "ScheduleExpression": schedule_expression,
-            "EventPattern": json.dumps(event_pattern) if event_pattern else None,
+            "EventPattern": json_dumps(event_pattern, sort_keys=True) if event_pattern else None,
             "State": state,
-            "Description": str(description) if description else description,
+            "Description": description,
             "RoleArn": role_arn,
-            "Tags": [{"Key": f"{key}", "Value": f"{value}"} for key, value in tags.items()] if tags else None,
+            "Tags": [{"Key": key, "Value": value if isinstance(value, str) else str(value)} for key, value in tags.items()] if tags else None,
             "Targets": targets
         })
 
@@ -110,31 +259,11 @@ def lambda_handler(event, context):
         # If a RETRY, then don't set starting point
         if pass_back_data:
             pass # If pass_back_data exists, then eh has already loaded in all relevant RETRY information.
-        # If NOT retrying, and we are instead upserting, then we start with the GET STATE call
-        elif event.get("op") == "upsert":
-
-            old_name = None
-
-            try:
-                old_name = prev_state["props"]["name"]
-            except:
-                pass
-
-            eh.add_op("get_rule")
-
-            # If any non-editable fields have changed, we are choosing to fail. 
-            # We are NOT choosing to delete and recreate the rule
-            if (old_name and old_name != name):
-
-                non_editable_error_message = "You may not edit the name of the existing rule. Please create a new component with the desired name."
-                eh.add_log("Cannot edit non-editable field", {"error": non_editable_error_message}, is_error=True)
-                eh.perm_error(non_editable_error_message, 10)
-
-        # If NOT retrying, and we are instead deleting, then we start with the DELETE call 
-        #   (sometimes you start with GET STATE if you need to make a call for the identifier)
-        elif event.get("op") == "delete":
-            eh.add_op("delete_rule")
-            eh.add_state({"name": prev_state["props"]["name"]})
+        # If NOT retrying, then the op decides the starting point
+        else:
+            setup_op = OP_SETUPS.get(event.get("op"))
+            if setup_op:
+                setup_op(prev_state, name)
 
         # The ordering of call declarations should generally be in the following order
         # GET STATE
@@ -166,7 +295,7 @@ def lambda_handler(event, context):
         add_permissions_for_targets()
         add_lambda_permissions(account_number)
         add_sns_permissions()
-        add_sqs_permissions(account_number)
+        add_sqs_permissions()
         ### GENERATE PROPS (sometimes can be done in get/create)
 
         # IMPORTANT! ALWAYS include this. Sends back appropriate data to CloudKommand.
@@ -195,14 +324,11 @@ def get_rule(attributes, region, prev_state):
     if existing_rule_name:
         # Try to get the rule. If you succeed, record the props and links from the current rule
         try:
-            payload = {
-                "Name": existing_rule_name
-            }
-            response = client.describe_rule(**payload)
+            response = client.describe_rule(Name=existing_rule_name)
             if response:
-                eh.add_log("Got Rule", response)
                 rule_name = response.get("Name")
                 rule_arn = response.get("Arn")
+                eh.add_log("Got Rule", {"name": rule_name, "arn": rule_arn})
                 rule_role_arn = response.get("RoleArn")
                 rule_event_bus_name = response.get("EventBusName")
                 eh.add_state({"name": rule_name, "arn": rule_arn, "role_arn": rule_role_arn, "event_bus_name": rule_event_bus_name, "region": region})
@@ -218,17 +344,25 @@ def get_rule(attributes, region, prev_state):
                 ### If the rule exists, then setup any followup tasks
 
                 # Setup rule update
-                comparable_attributes = {item: attributes[item] for item in attributes if item not in ["Tags", "Targets"]}
-                comparable_response = {item: response[item] for item in response if item in comparable_attributes } # We only care when the values that are manually set by the user do not match
+                comparable_attributes = {item: attributes[item] for item in attributes.keys() - UPDATE_EXCLUDE}
+                comparable_response = {item: response[item] for item in comparable_attributes.keys() & response.keys()} # We only care when the values that are manually set by the user do not match
+                # The desired event pattern is already serialized with sorted keys, so only the returned one needs normalizing
+                if comparable_response.get("EventPattern") and normalize_event_pattern(comparable_response["EventPattern"]) == comparable_attributes.get("EventPattern"):
+                    comparable_response["EventPattern"] = comparable_attributes["EventPattern"]
                 if comparable_attributes != comparable_response:
                     eh.add_op("update_rule")
 
+                # The tags and targets lookups only depend on the rule, so make both calls concurrently
+                tags_future = submit(client.list_tags_for_resource, ResourceARN=rule_arn)
+                targets_future = submit(list_rule_targets, rule_name)
+                tags_checked = targets_checked = False
+
                 # Setup tags update
                 try:
                     # Try to get the current tags
-                    response = client.list_tags_for_resource(ResourceARN=rule_arn)
-                    eh.add_log("Got Tags", response)
+                    response = tags_future.result()
                     relevant_items = response.get("Tags", [])
+                    eh.add_log("Got Tags", {"count": len(relevant_items)})
 
                     # Parse out the current tags
                     current_tags = {item.get("Key") : item.get("Value") for item in relevant_items}
@@ -240,8 +374,8 @@ def get_rule(attributes, region, prev_state):
                         formatted_tags = {item.get("Key") : item.get("Value") for item in tags}
                         # Compare the current tags to the desired tags
                         if formatted_tags != current_tags:
-                            remove_tags = [k for k in current_tags.keys() if k not in formatted_tags]
-                            add_tags = {k:v for k,v in formatted_tags.items() if v != current_tags.get(k)}
+                            remove_tags = list(current_tags.keys() - formatted_tags.keys())
+                            add_tags = [item for item in tags if current_tags.get(item["Key"], MISSING) != item["Value"]]
                             if remove_tags:
                                 eh.add_op("remove_tags", remove_tags)
                             if add_tags:
@@ -250,14 +384,15 @@ def get_rule(attributes, region, prev_state):
                     else:
                         if current_tags:
                             eh.add_op("remove_tags", list(current_tags.keys()))
+                    tags_checked = True
 
                 # If the rule does not exist, something has gone wrong. Probably don't permanently fail though, try to continue.
-                except client.exceptions.ResourceNotFoundException:
+                except ResourceNotFoundException:
                     eh.add_log("Rule Not Found", {"name": rule_name})
-                    eh.retry_error("Rule Not Found -- Retrying", 20)
-                except client.exceptions.InternalException as e:
+                    retry_with_jitter("Rule Not Found -- Retrying", 20)
+                except InternalException as e:
                     eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-                    eh.retry_error("AWS Internal Error -- Retrying", 20)
+                    retry_with_jitter("AWS Internal Error -- Retrying", 20)
                 except ClientError as e:
                     handle_common_errors(e, eh, "Error Updating Rule Tags", progress=20)
 
@@ -265,69 +400,58 @@ def get_rule(attributes, region, prev_state):
                 # Setup targets update
                 try:
                     # Try to get the current targets
-                    response = client.list_targets_by_rule(Rule=rule_name)
-                    eh.add_log("Got Targets", response)
-                    relevant_targets = response.get("Targets", [])
+                    relevant_targets = targets_future.result()
+                    eh.add_log("Got Targets", {"count": len(relevant_targets)})
 
-                    remove_targets = [target.get("Id") for target in relevant_targets if target.get("Id") not in attributes.get("Targets")]
+                    desired_targets = attributes.get("Targets") or {}
+                    existing_targets = {target.get("Id"): target for target in relevant_targets}
+                    remove_targets = list(existing_targets.keys() - desired_targets.keys())
                     if remove_targets:
                         eh.add_op("remove_targets", remove_targets)
-                    
-                    put_targets = [{**attributes.get("Targets").get(target), "id": target} for target in attributes.get("Targets") if target not in remove_targets]
-                    formatted_put_targets = []
-                    for item in put_targets:
-                        formatted_target = remove_none_attributes({
-                            'Id': item.get("id"),
-                            'Arn': item.get("arn"),
-                            'RoleArn': item.get("role_arn"),
-                            'Input': item.get("input"),
-                            'InputPath': item.get("input_path"),
-                            'HttpParameters': remove_none_attributes({
-                                'PathParameterValues': item.get("http_path_parameter_values") if item.get("http_path_parameter_values") else None,
-                                'HeaderParameters': item.get("http_header_parameters") if item.get("http_header_parameters") else None,
-                                'QueryStringParameters': item.get("http_query_string_parameters") if item.get("http_query_string_parameters") else None
-                            }) if any( http_key in item for http_key in ["http_path_parameter_values", "http_header_parameters", "http_query_string_parameters"]) else None,
-                            'DeadLetterConfig': {
-                                'Arn': item.get("dead_letter_queue_arn")
-                            } if item.get("dead_letter_queue_arn") else None,
-                            'RetryPolicy': remove_none_attributes({
-                                'MaximumRetryAttempts': item.get("maximum_retry_attempts"),
-                                'MaximumEventAgeInSeconds': item.get("maximum_event_age_in_seconds")
-                            }) if any( retry_key in item for retry_key in ["maximum_retry_attempts", "maximum_event_age_in_seconds"]) else None,
-                        })
-                        formatted_put_targets.append(formatted_target)
+
+                    formatted_targets = [format_target({**target, "id": target_id}) for target_id, target in desired_targets.items()]
+                    # Only send the targets that are new or whose configuration changed
+                    formatted_put_targets = [target for target in formatted_targets if existing_targets.get(target["Id"]) != target]
 
                     if formatted_put_targets:
                         eh.add_op("put_targets", formatted_put_targets)
+                    # Permissions are still checked for every target, in case a target resource was recreated and lost them
+                    if formatted_targets:
+                        eh.add_op("add_permissions_for_targets", formatted_targets)
+                    targets_checked = True
 
                 # If the rule does not exist, something has gone wrong. Probably don't permanently fail though, try to continue.
-                except client.exceptions.ResourceNotFoundException:
+                except ResourceNotFoundException:
                     eh.add_log("Rule Not Found", {"name": rule_name})
-                    eh.retry_error("Rule Not Found -- Retrying", 25)
-                except client.exceptions.InternalException as e:
+                    retry_with_jitter("Rule Not Found -- Retrying", 25)
+                except InternalException as e:
                     eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-                    eh.retry_error("AWS Internal Error -- Retrying", 25)
+                    retry_with_jitter("AWS Internal Error -- Retrying", 25)
                 except ClientError as e:
                     handle_common_errors(e, eh, "Error Getting Rule Targets", progress=25)
 
+                # Only reset once both lookups went through, so a lookup that keeps failing still backs off further each time
+                if tags_checked and targets_checked:
+                    reset_backoff()
+
 
             else:
                 eh.add_log("Rule Does Not Exist", {"name": existing_rule_name})
                 eh.add_op("create_rule")
                 return 0
         # If there is no cache policy and there is an exception handle it here
-        except client.exceptions.ResourceNotFoundException:
+        except ResourceNotFoundException:
             eh.add_log("Rule Does Not Exist", {"name": existing_rule_name})
             eh.add_op("create_rule")
             return 0
-        except client.exceptions.InternalException: # I believe this should not happen unless the plugin has insufficient permissions
+        except InternalException: # I believe this should not happen unless the plugin has insufficient permissions
             eh.add_log("AWS had an internal error. Working on handling this regardless.", {"name": existing_rule_name})
             eh.add_op("create_rule")
             return 0
         except ClientError as e:
             print(str(e))
             eh.add_log("Get Rule Error", {"error": str(e)}, is_error=True)
-            eh.retry_error("Get Rule Error", 10)
+            retry_with_jitter("Get Rule Error", 10)
             return 0
     else:
         eh.add_log("Rule Does Not Exist", {"name": existing_rule_name})
@@ -338,11 +462,11 @@ def get_rule(attributes, region, prev_state):
 @ext(handler=eh, op="create_rule")
 def create_rule(attributes, region, prev_state):
 
-    attributes_to_use = {item: attributes[item] for item in attributes if item not in ["Targets"]}
+    attributes_to_use = {item: attributes[item] for item in attributes.keys() - CREATE_EXCLUDE}
 
     try:
         response = client.put_rule(**attributes_to_use)
-        eh.add_log("Created Rule", response)
+        eh.add_log("Created Rule", strip_response_metadata(response))
         rule_name = attributes_to_use.get("Name")
         rule_arn = response.get("RuleArn")
         rule_role_arn = attributes_to_use.get("RoleArn")
@@ -356,29 +480,20 @@ def create_rule(attributes, region, prev_state):
         }
         eh.add_props(props_to_add)
         eh.add_links({"Rule": gen_rule_link(region, rule_name=rule_name, event_bus_name=rule_event_bus_name)})
+        reset_backoff()
 
         ### Once the rule exists, then setup any followup tasks
 
         # N/A, in the case of this plugin
 
-    except client.exceptions.InvalidEventPatternException as e:
-        eh.add_log(f"The event pattern specified is invalid. Please check your event pattern and try again.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 20)
-    except client.exceptions.LimitExceededException as e:
-        eh.add_log(f"AWS Quota for EventBridge Rules reached. Please increase your quota and try again.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 20)
-    except client.exceptions.ConcurrentModificationException as e:
+    except ConcurrentModificationException as e:
         eh.add_log(f"Concurrent modification of this Rule. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("Concurrent modification of Rule", 20)
-    except client.exceptions.ManagedRuleException as e:
-        eh.add_log(f"This rule was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 20)
-    except client.exceptions.InternalException as e:
+        retry_with_jitter("Concurrent modification of Rule", 20)
+    except InternalException as e:
         eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("AWS Internal Error -- Retrying", 20)
-    except client.exceptions.ResourceNotFoundException as e:
-        eh.add_log(f"Rule Not Found", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 20)
+        retry_with_jitter("AWS Internal Error -- Retrying", 20)
+    except RULE_ERRORS as e:
+        handle_rule_error(e, 20)
     except ClientError as e:
         handle_common_errors(e, eh, "Error Creating Rule", progress=20)
 
@@ -386,14 +501,14 @@ def create_rule(attributes, region, prev_state):
 @ext(handler=eh, op="update_rule")
 def update_rule(attributes, region, prev_state):
 
-    attributes_to_use = {item: attributes[item] for item in attributes if item not in ["Tags", "Targets"]}
+    attributes_to_use = {item: attributes[item] for item in attributes.keys() - UPDATE_EXCLUDE}
     existing_rule_name = eh.state["name"]
     existing_rule_role_arn = eh.state["role_arn"]
     existing_rule_event_bus_name = eh.state["event_bus_name"]
 
     try:
         response = client.put_rule(**attributes_to_use)
-        eh.add_log("Updated Rule", response)
+        eh.add_log("Updated Rule", strip_response_metadata(response))
         rule_name = attributes.get("Name") or existing_rule_name
         rule_arn = response.get("RuleArn")
         rule_role_arn = attributes.get("RoleArn") or existing_rule_role_arn
@@ -407,29 +522,20 @@ def update_rule(attributes, region, prev_state):
         }
         eh.add_props(props_to_add)
         eh.add_links({"Rule": gen_rule_link(region, rule_name=rule_name, event_bus_name=rule_event_bus_name)})
+        reset_backoff()
 
         ### Once the rule exists, then setup any followup tasks
 
         # N/A, in the case of this plugin
 
-    except client.exceptions.InvalidEventPatternException as e:
-        eh.add_log(f"The event pattern specified is invalid. Please check your event pattern and try again.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 20)
-    except client.exceptions.LimitExceededException as e:
-        eh.add_log(f"AWS Quota for EventBridge Rules reached. Please increase your quota and try again.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 20)
-    except client.exceptions.ConcurrentModificationException as e:
+    except ConcurrentModificationException as e:
         eh.add_log(f"Concurrent modification of this Rule. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("Concurrent modification of Rule", 20)
-    except client.exceptions.ManagedRuleException as e:
-        eh.add_log(f"This rule was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 20)
-    except client.exceptions.InternalException as e:
+        retry_with_jitter("Concurrent modification of Rule", 20)
+    except InternalException as e:
         eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("AWS Internal Error -- Retrying", 20)
-    except client.exceptions.ResourceNotFoundException as e:
-        eh.add_log(f"Rule Not Found", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 20)
+        retry_with_jitter("AWS Internal Error -- Retrying", 20)
+    except RULE_ERRORS as e:
+        handle_rule_error(e, 20)
     except ClientError as e:
         handle_common_errors(e, eh, "Error Creating Rule", progress=20)
 
@@ -446,19 +552,16 @@ def remove_tags():
             TagKeys=remove_tags
         )
         eh.add_log("Removed Tags", remove_tags)
+        reset_backoff()
 
-    except client.exceptions.ConcurrentModificationException as e:
+    except ConcurrentModificationException as e:
         eh.add_log(f"Concurrent modification of this Rule. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("Concurrent modification of Rule", 80)
-    except client.exceptions.ManagedRuleException as e:
-        eh.add_log(f"This rule was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
-    except client.exceptions.InternalException as e:
+        retry_with_jitter("Concurrent modification of Rule", 80)
+    except InternalException as e:
         eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("AWS Internal Error -- Retrying", 80)
-    except client.exceptions.ResourceNotFoundException as e:
-        eh.add_log(f"Rule Not Found", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
+        retry_with_jitter("AWS Internal Error -- Retrying", 80)
+    except RULE_ERRORS as e:
+        handle_rule_error(e, 80)
     except ClientError as e:
         handle_common_errors(e, eh, "Error Removing Rule Tags", progress=80)
 
@@ -472,23 +575,19 @@ def set_tags():
     try:
         response = client.tag_resource(
             ResourceARN=rule_arn,
-            Tags=[{"Key": key, "Value": value} for key, value in tags.items()]
+            Tags=tags
         )
-        eh.add_log("Tags Added", response)
+        eh.add_log("Tags Added", strip_response_metadata(response))
+        reset_backoff()
 
-    except client.exceptions.ConcurrentModificationException as e:
+    except ConcurrentModificationException as e:
         eh.add_log(f"Concurrent modification of this Rule. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("Concurrent modification of Rule", 90)
-    except client.exceptions.ManagedRuleException as e:
-        eh.add_log(f"This rule was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 90)
-    except client.exceptions.InternalException as e:
+        retry_with_jitter("Concurrent modification of Rule", 90)
+    except InternalException as e:
         eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("AWS Internal Error -- Retrying", 90)
-    except client.exceptions.ResourceNotFoundException as e:
-        eh.add_log(f"Rule Not Found", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 90)
-
+        retry_with_jitter("AWS Internal Error -- Retrying", 90)
+    except RULE_ERRORS as e:
+        handle_rule_error(e, 90)
     except ClientError as e:
         handle_common_errors(e, eh, "Error Adding Tags", progress=90)
 
@@ -497,44 +596,41 @@ def put_targets():
 
     put_targets = eh.ops.get('put_targets')
     rule_name= eh.state["name"]
+    # On a retry, resume at the first batch that was not accepted
+    cursor = eh.state.get("put_targets_cursor", 0)
 
     try:
-        response = client.put_targets(
-            Rule=rule_name,
-            Targets=put_targets
-        )
-        print(response)
-        if response.get("FailedEntryCount") > 0:
-            failed_entries = response.get("FailedEntries")
-            retry_codes = ["ResourceNotFoundException", "InternalException", "ConcurrentModificationException", "LimitExceededException"]
-            if all([item.get("ErrorCode") not in retry_codes for item in failed_entries]):
-                for item in failed_entries:
-                    eh.add_log(f"The target {item.get('TargetId')} was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": str(e)}, is_error=True)
-                eh.perm_error(str(e), 80)
-            else:
-                for item in failed_entries:
-                    eh.add_log(f"The target {item.get('TargetId')} was not added to the rule due to error code {item.get('ErrorCode')} and error message {item.get('ErrorMessage')}. Retrying.", {"error": str(e)}, is_error=True)
-                eh.retry_error(f"Retrying Errors: {', '.join([item.get('ErrorCode') for item in failed_entries])}", 80)
+        for batch_start in range(cursor, len(put_targets), MAX_TARGETS_PER_CALL):
+            response = client.put_targets(
+                Rule=rule_name,
+                Targets=put_targets[batch_start:batch_start + MAX_TARGETS_PER_CALL]
+            )
+            print(response)
+            if response.get("FailedEntryCount") > 0:
+                failed_entries = response.get("FailedEntries")
+                if all(item.get("ErrorCode") not in PUT_TARGETS_RETRY_CODES for item in failed_entries):
+                    for item in failed_entries:
+                        eh.add_log(f"The target {item.get('TargetId')} was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": item.get("ErrorMessage")}, is_error=True)
+                    eh.perm_error(failed_entries_message(failed_entries), 80)
+                else:
+                    for item in failed_entries:
+                        eh.add_log(f"The target {item.get('TargetId')} was not added to the rule due to error code {item.get('ErrorCode')} and error message {item.get('ErrorMessage')}. Retrying.", {"error": item.get("ErrorMessage")}, is_error=True)
+                    retry_with_jitter(f"Retrying Errors: {', '.join(item.get('ErrorCode') for item in failed_entries)}", 80)
+                return 0
+            eh.add_state({"put_targets_cursor": batch_start + MAX_TARGETS_PER_CALL})
 
         eh.add_log("Put Targets", put_targets)
-        eh.add_op("add_permissions_for_targets", put_targets)
+        reset_backoff()
 
 
-    except client.exceptions.ConcurrentModificationException as e:
+    except ConcurrentModificationException as e:
         eh.add_log(f"Concurrent modification of the Target. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("Concurrent modification of Target", 80)
-    except client.exceptions.ManagedRuleException as e:
-        eh.add_log(f"This rule was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
-    except client.exceptions.InternalException as e:
+        retry_with_jitter("Concurrent modification of Target", 80)
+    except InternalException as e:
         eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("AWS Internal Error -- Retrying", 80)
-    except client.exceptions.LimitExceededException as e:
-        eh.add_log(f"AWS Quota for EventBridge Rules/Targets reached. Please increase your quota and try again.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
-    except client.exceptions.ResourceNotFoundException as e:
-        eh.add_log(f"Rule Not Found", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
+        retry_with_jitter("AWS Internal Error -- Retrying", 80)
+    except RULE_ERRORS as e:
+        handle_rule_error(e, 80)
     except ClientError as e:
         handle_common_errors(e, eh, "Error Updating Rule Targets", progress=80)
 
@@ -544,48 +640,46 @@ def remove_targets():
     remove_targets = eh.ops.get('remove_targets')
     rule_name= eh.state["name"]
     event_bus_name= eh.state["event_bus_name"]
+    # On a retry, resume at the first batch that was not accepted
+    cursor = eh.state.get("remove_targets_cursor", 0)
 
     try:
-        response = client.remove_targets(
-            Rule=rule_name,
-            EventBusName=event_bus_name,
-            Ids=remove_targets,
-            Force=False
-        )
-        print(response)
-        if response.get("FailedEntryCount") > 0:
-            failed_entries = response.get("FailedEntries")
-            retry_codes = ["InternalException", "ConcurrentModificationException"]
-            if all([item.get("ErrorCode") == "ResourceNotFoundException" for item in failed_entries]):
-                eh.add_log(f"Rule/Event Bus combination Not Found. Targets Already Deleted.", {"error": str(e)}, is_error=True)
+        for batch_start in range(cursor, len(remove_targets), MAX_TARGETS_PER_CALL):
+            response = client.remove_targets(
+                Rule=rule_name,
+                EventBusName=event_bus_name,
+                Ids=remove_targets[batch_start:batch_start + MAX_TARGETS_PER_CALL],
+                Force=False
+            )
+            print(response)
+            if response.get("FailedEntryCount") > 0:
+                failed_entries = response.get("FailedEntries")
+                if all(item.get("ErrorCode") == "ResourceNotFoundException" for item in failed_entries):
+                    eh.add_log(f"Rule/Event Bus combination Not Found. Targets Already Deleted.", {"error": failed_entries_message(failed_entries)}, is_error=True)
+                    return 0
+                elif all(item.get("ErrorCode") == "ManagedRuleException" for item in failed_entries):
+                    for item in failed_entries:
+                        eh.add_log(f"The rule {rule_name} specified for the target {item.get('TargetId')} was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": item.get("ErrorMessage")}, is_error=True)
+                    eh.perm_error(failed_entries_message(failed_entries), 80)
+                else:
+                    for item in failed_entries:
+                        eh.add_log(f"The target {item.get('TargetId')} was not removed from the rule due to error code {item.get('ErrorCode')} and error message {item.get('ErrorMessage')}. Retrying.", {"error": item.get("ErrorMessage")}, is_error=True)
+                    retry_with_jitter(f"Retrying Errors: {', '.join(item.get('ErrorCode') for item in failed_entries)}", 80)
                 return 0
-            elif all([item.get("ErrorCode") == "ManagedRuleException" for item in failed_entries]):
-                for item in failed_entries:
-                    eh.add_log(f"The rule {rule_name} specified for the target {item.get('TargetId')} was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": str(e)}, is_error=True)
-                eh.perm_error(str(e), 80)
-            else:
-                for item in failed_entries:
-                    eh.add_log(f"The target {item.get('TargetId')} was not removed from the rule due to error code {item.get('ErrorCode')} and error message {item.get('ErrorMessage')}. Retrying.", {"error": str(e)}, is_error=True)
-                eh.retry_error(f"Retrying Errors: {', '.join([item.get('ErrorCode') for item in failed_entries])}", 80)
+            eh.add_state({"remove_targets_cursor": batch_start + MAX_TARGETS_PER_CALL})
 
         eh.add_log("Removed Targets", remove_targets)
+        reset_backoff()
 
 
-    except client.exceptions.ConcurrentModificationException as e:
+    except ConcurrentModificationException as e:
         eh.add_log(f"Concurrent modification of the Target. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("Concurrent modification of Target", 80)
-    except client.exceptions.ManagedRuleException as e:
-        eh.add_log(f"This rule was created by an AWS service on behalf of your account. It is managed by that service and editing it is restricted.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
-    except client.exceptions.InternalException as e:
+        retry_with_jitter("Concurrent modification of Target", 80)
+    except InternalException as e:
         eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("AWS Internal Error -- Retrying", 80)
-    except client.exceptions.LimitExceededException as e:
-        eh.add_log(f"AWS Quota for EventBridge Rules/Targets reached. Please increase your quota and try again.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
-    except client.exceptions.ResourceNotFoundException as e:
-        eh.add_log(f"Rule Not Found", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
+        retry_with_jitter("AWS Internal Error -- Retrying", 80)
+    except RULE_ERRORS as e:
+        handle_rule_error(e, 80)
     except ClientError as e:
         handle_common_errors(e, eh, "Error Updating Rule Targets", progress=80)
 
@@ -595,27 +689,16 @@ def remove_targets():
 def add_permissions_for_targets():
     targets_to_add_permissions_to = eh.ops.get('add_permissions_for_targets')
     
-    lambdas_to_add_permissions_to = []
-    sns_topics_to_add_permissions_to = []
-    sqs_queues_to_add_permissions_to = []
+    arns_by_op = {}
     for target in targets_to_add_permissions_to:
-        target_type = analyze_type_of_arn(target.get("Arn"))
-        if target_type == "lambda": 
-            lambdas_to_add_permissions_to.append(target.get("Arn"))
-        elif target_type == "sns":
-            sns_topics_to_add_permissions_to.append(target.get("Arn"))
-        elif target_type == "sqs": 
-            sqs_queues_to_add_permissions_to.append(target.get("Arn"))
-        else:
-            # Do nothing, they are either unsupported or (way more likely) using role_arn for permissions
-            pass
-    
-    if lambdas_to_add_permissions_to:
-        eh.add_op("add_lambda_permissions", lambdas_to_add_permissions_to)
-    if sns_topics_to_add_permissions_to:
-        eh.add_op("add_sns_permissions", sns_topics_to_add_permissions_to)
-    if sqs_queues_to_add_permissions_to:
-        eh.add_op("add_sqs_permissions", sqs_queues_to_add_permissions_to)
+        target_arn = target.get("Arn")
+        permission_op = TARGET_PERMISSION_OPS.get(analyze_type_of_arn(target_arn))
+        # Anything else is either unsupported or (way more likely) using role_arn for permissions
+        if permission_op:
+            arns_by_op.setdefault(permission_op, []).append(target_arn)
+
+    for permission_op, target_arns in arns_by_op.items():
+        eh.add_op(permission_op, target_arns)
 
     return 0
 
@@ -623,171 +706,326 @@ def add_permissions_for_targets():
 @ext(handler=eh, op="add_lambda_permissions")
 def add_lambda_permissions(account_number):
 
-    lambda_client = boto3.client("lambda")
     lambdas = eh.ops['add_lambda_permissions']
+    if not lambdas:
+        return 0
     rule_name = eh.state["name"]
     rule_arn = eh.state["arn"]
 
-    for l in lambdas:
-        try:
-            response = lambda_client.add_permission(
-                FunctionName=l,
-                StatementId=f"EB_INVOKE_{rule_name}",
-                Action="lambda:InvokeFunction",
-                Principal="events.amazonaws.com",
-                SourceAccount=str(account_number),
-                SourceArn=rule_arn
-            )
-            eh.add_log("Added Permission to Lambda", response)
-        except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == 'ResourceConflictException':
-                pass
-            else:
-                raise e
+    # Each target is independent, so the calls are made concurrently and logged once they have all returned
+    statement_id = f"EB_INVOKE_{rule_name}"
+    source_account = str(account_number)
+    futures = [submit(add_lambda_permission, l, statement_id, rule_arn, source_account) for l in lambdas]
+    responses = [future.result() for future in futures]
+
+    log_permission_results("Lambda Permissions", lambdas, responses)
 
 @ext(handler=eh, op="add_sns_permissions")
 def add_sns_permissions():
 
-    sns_client = boto3.client('sns')
     sns_topics = eh.ops['add_sns_permissions']
+    if not sns_topics:
+        return 0
 
-    for t in sns_topics:
-        try:
-            statement_id = "PublishEventsToMyTopic"
-            statement_to_add = {
-                "Sid": statement_id,
-                "Effect": "Allow",
-                "Principal": {
-                    "Service": "events.amazonaws.com"
-                },
-                "Action": "sns:Publish",
-                "Resource": t
-            }
-            # Get the current policy
-            response = sns_client.get_topic_attributes(
-                TopicArn=t
-            )
-            # Format the policy with the new statement (as needed)
-            existing_policy = json.loads(response.get("Attributes", {}).get("Policy", "{}"))
-            existing_policy_statements = existing_policy.get("Statement")
-            existing_policy_statements_to_add_to = [item for item in existing_policy_statements if item.get("Sid") != statement_id]
-            all_statements = [*existing_policy_statements_to_add_to, statement_to_add]
-            existing_policy["Statement"] = all_statements
-            # Save the modified policy
-            response = sns_client.set_topic_attributes(
-                TopicArn=t,
-                AttributeName='Policy',
-                AttributeValue=json.dumps(existing_policy)
-            )
-            eh.add_log(f"Added Permission for Rule to Target SNS Topic", response)
-        except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == 'ResourceConflictException':
-                pass
-            else:
-                raise e
+    futures = [submit(add_sns_permission, t) for t in sns_topics]
+    responses = [future.result() for future in futures]
+
+    log_permission_results("SNS Topic Permissions", sns_topics, responses)
             
 @ext(handler=eh, op="add_sqs_permissions")
-def add_sqs_permissions(account_number):
+def add_sqs_permissions():
 
-    sqs_client = boto3.client('sqs')
     sqs_queues = eh.ops['add_sqs_permissions']
+    if not sqs_queues:
+        return 0
 
-    region = eh.state["region"]
     rule_name = eh.state["name"]
-    rule_event_bus_name = eh.state["event_bus_name"]
-    
-    sqs_queue_formatted_rule_arn = f"arn:aws:events:{region}:{account_number}:rule/{rule_event_bus_name}/{rule_name}"
+    # The ARN from PutRule/DescribeRule, so the condition always has the rule's real partition and path
+    rule_arn = eh.state["arn"]
 
-    for q in sqs_queues:
-        try:
-            statement_id = f"AWSEvents_{rule_name}"
-            statement_to_add = {
-                "Sid": statement_id,
-                "Effect": "Allow",
-                "Principal": {
-                    "Service": "events.amazonaws.com"
-                },
-                "Action": "sqs:SendMessage",
-                "Resource": q,
-                "Condition": {
-                    "ArnEquals": {
-                        "aws:SourceArn": sqs_queue_formatted_rule_arn
-                    }
-                }
-            }
-            # Figure out the queue url from the arn
-            queue_name = q.split(":")[5]
-            response = sqs_client.get_queue_url(
-                QueueName=queue_name
-            )
-            queue_url = response.get("QueueUrl")
-            # Get the current queue policy
-            response = sqs_client.get_queue_attributes(
-                QueueUrl=queue_url,
-                AttributeNames=['Policy']
-            )
-            # Format the policy with the new statement
-            existing_policy = json.loads(response.get("Attributes", {}).get("Policy", "{}"))
-            existing_policy_statements = existing_policy.get("Statement", [])
-            existing_policy_statements_to_add_to = [item for item in existing_policy_statements if item.get("Sid") != statement_id]
-            all_statements = [*existing_policy_statements_to_add_to, statement_to_add]
-            existing_policy["Statement"] = all_statements
-
-            formatted_attributes = {
-                "Policy": json.dumps(existing_policy)
+    # Queue URLs don't change for a given queue ARN, so a retry reuses the ones already resolved
+    queue_urls = eh.state.get("queue_urls", {})
+    unresolved_queues = [q for q in sqs_queues if q not in queue_urls]
+    if unresolved_queues:
+        url_futures = [submit(get_queue_url, q) for q in unresolved_queues]
+        queue_urls = {**queue_urls, **{q: future.result() for q, future in zip(unresolved_queues, url_futures)}}
+        eh.add_state({"queue_urls": queue_urls})
+
+    # Every queue gets the same statement apart from its Resource
+    base_statement = {
+        "Sid": f"AWSEvents_{rule_name}",
+        "Effect": "Allow",
+        "Principal": {
+            "Service": "events.amazonaws.com"
+        },
+        "Action": "sqs:SendMessage",
+        "Condition": {
+            "ArnEquals": {
+                "aws:SourceArn": rule_arn
             }
-            # Set the modified policy on the sqs queue
-            response = sqs_client.set_queue_attributes(
-                QueueUrl=queue_url,
-                Attributes=formatted_attributes
-            )
-            eh.add_log(f"Added Permission for Rule to Target SQS Queue", response)
-        except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == 'ResourceConflictException':
-                pass
-            else:
-                raise e
+        }
+    }
+    futures = [submit(add_sqs_permission, q, queue_urls[q], base_statement) for q in sqs_queues]
+    responses = [future.result() for future in futures]
+
+    log_permission_results("SQS Queue Permissions", sqs_queues, responses)
 
 @ext(handler=eh, op="delete_rule")
 def delete_rule():
     existing_rule_name = eh.state["name"]
 
     try:
-        payload = {
-            "Name": existing_rule_name
-        }
-        response = client.delete_rule(**payload)
+        response = client.delete_rule(Name=existing_rule_name)
         eh.add_log("Rule Deleted", {"name": existing_rule_name})
+        reset_backoff()
 
-    except client.exceptions.ConcurrentModificationException as e:
-        eh.add_log(f"Concurrent modification of this Rule. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("Concurrent modification of Rule", 80)
-    except client.exceptions.ManagedRuleException as e:
-        eh.add_log(f"This rule was created by an AWS service on behalf of your account. It is managed by that service and editing/deleting it is restricted.", {"error": str(e)}, is_error=True)
-        eh.perm_error(str(e), 80)
-    except client.exceptions.InternalException as e:
-        eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
-        eh.retry_error("AWS Internal Error -- Retrying", 80)
-    except client.exceptions.ResourceNotFoundException as e:
+    except ResourceNotFoundException as e:
         eh.add_log(f"Rule Not Found", {"error": str(e)}, is_error=True)
         return 0
+    except ConcurrentModificationException as e:
+        eh.add_log(f"Concurrent modification of this Rule. Retrying.", {"error": str(e)}, is_error=True)
+        retry_with_jitter("Concurrent modification of Rule", 80)
+    except InternalException as e:
+        eh.add_log(f"AWS had an internal error. Retrying.", {"error": str(e)}, is_error=True)
+        retry_with_jitter("AWS Internal Error -- Retrying", 80)
+    except RULE_ERRORS as e:
+        handle_rule_error(e, 80)
     except ClientError as e:
         handle_common_errors(e, eh, "Error Deleting Rule", progress=80)
     
 
+def handle_rule_error(e, progress):
+    eh.add_log(RULE_ERROR_MESSAGES.get(type(e), "Error Updating Rule"), {"error": str(e)}, is_error=True)
+    eh.perm_error(str(e), progress)
+
+
+def submit(fn, *args, **kwargs):
+    # Rebuild the shared pool if it has been shut down, rather than failing the op
+    global POOL
+    try:
+        return POOL.submit(fn, *args, **kwargs)
+    except RuntimeError:
+        POOL = ThreadPoolExecutor(max_workers=POOL_MAX_WORKERS, thread_name_prefix="eventbridge")
+        return POOL.submit(fn, *args, **kwargs)
+
+
+def jittered_callback(prev_sec, cap=30):
+    # Decorrelated jitter, so concurrent deployments retrying the same API spread out instead of re-firing in lockstep
+    return min(cap, random.uniform(1, prev_sec * 3))
+
+
+def retry_with_jitter(error_message, progress):
+    callback_sec = jittered_callback(eh.state.get("last_backoff", 1))
+    eh.add_state({"last_backoff": callback_sec})
+    eh.retry_error(error_message, progress, callback_sec=callback_sec)
+
+
+def reset_backoff():
+    # Once a retried op goes through, a later op that has to retry starts again from the shortest backoff
+    eh.add_state({"last_backoff": 1})
+
+
+def list_rule_targets(rule_name):
+    # list_targets_by_rule returns at most 100 targets per page
+    paginator = client.get_paginator("list_targets_by_rule")
+    return [target for page in paginator.paginate(Rule=rule_name, PaginationConfig={"PageSize": 100}) for target in page.get("Targets", [])]
+
+
+def format_target(item):
+    # Builds the put_targets entry in one pass, only inserting the keys that are set
+    get = item.get
+    formatted_target = {}
+    for key, item_key in SIMPLE_FIELDS:
+        value = get(item_key)
+        if value is not None:
+            formatted_target[key] = value
+
+    if not HTTP_KEYS.isdisjoint(item):
+        http_parameters = {}
+        for key, item_key in HTTP_FIELDS:
+            value = get(item_key)
+            if value:
+                http_parameters[key] = value
+        # ListTargetsByRule never returns an empty HttpParameters, so sending one would always look like a change
+        if http_parameters:
+            formatted_target["HttpParameters"] = http_parameters
+
+    dead_letter_queue_arn = get("dead_letter_queue_arn")
+    if dead_letter_queue_arn:
+        formatted_target["DeadLetterConfig"] = {"Arn": dead_letter_queue_arn}
+
+    if not RETRY_KEYS.isdisjoint(item):
+        retry_policy = {}
+        for key, item_key in RETRY_FIELDS:
+            value = get(item_key)
+            if value is not None:
+                retry_policy[key] = value
+        if retry_policy:
+            formatted_target["RetryPolicy"] = retry_policy
+
+    return formatted_target
+
+
+def json_loads(value):
+    return orjson.loads(value) if orjson else json.loads(value)
+
+
+def json_dumps(value, sort_keys=False):
+    # Compact separators in both branches, so the output doesn't depend on whether orjson is available
+    if orjson:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode()
+    return json.dumps(value, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False)
+
+
+def normalize_event_pattern(event_pattern):
+    # Canonical form of an event pattern string, so that key order and whitespace don't count as changes
+    return json_dumps(json_loads(event_pattern), sort_keys=True) if event_pattern else event_pattern
+
+
+def strip_response_metadata(response):
+    # ResponseMetadata (request id, HTTP headers, retry counts) is noise in the deployment logs
+    return {k: v for k, v in response.items() if k != "ResponseMetadata"}
+
+
+def failed_entries_message(failed_entries):
+    return ", ".join(f"{item.get('TargetId')}: {item.get('ErrorCode')} ({item.get('ErrorMessage')})" for item in failed_entries)
+
+
+@lru_cache(maxsize=128)
 def gen_rule_link(region, rule_name, event_bus_name):
-    return f"https://{region}.console.aws.amazon.com/events/home?region={region}#/eventbus/{event_bus_name}/rules/{rule_name}"
+    return RULE_LINK_TEMPLATE.format(region=region, event_bus_name=event_bus_name, rule_name=rule_name)
 
 
+@lru_cache(maxsize=1024)
 def analyze_type_of_arn(arn):
     ### https://docs.aws.amazon.com/eventbridge/latest/userguide/eb-use-resource-based.html
     # API GATEWAY section is out of date. This works based on RoleArn now.
     # Also, NOT supporting Cloudwatch Logs for this first iteration. You can have 10 statements total for all of cloudwatch's resource policy per region. Terrible. Call a lambda instead unless someone badly wants this.
-    if arn.startswith("arn:aws:lambda"):
-        return "lambda"
-    elif arn.startswith("arn:aws:sns"):
-        return "sns"
-    elif arn.startswith("arn:aws:sqs"):
-        return "sqs"
-    else:
-        return "not_supported_or_unnecessary"
\ No newline at end of file
+    # arn:partition:service:... -- only the service segment matters, so split no further than that
+    arn_parts = arn.split(":", 3)
+    service = arn_parts[2] if len(arn_parts) > 2 else None
+    return service if service in TARGET_PERMISSION_OPS else "not_supported_or_unnecessary"
+
+
+def log_permission_results(title, target_arns, responses):
+    # One summary log per op rather than one log per target response
+    added = []
+    already_current = []
+    conflicted = []
+    for target_arn, response in zip(target_arns, responses):
+        if response is POLICY_CURRENT:
+            already_current.append(target_arn)
+        # None means the service rejected the change with a ResourceConflictException
+        elif response is None:
+            conflicted.append(target_arn)
+        else:
+            added.append(target_arn)
+    eh.add_log(title, {"added": added, "already_current": already_current, "conflicted": conflicted})
+
+
+def policy_statements(policy):
+    # A policy's Statement may be missing, null, or a single statement object rather than a list
+    statements = policy.get("Statement") or []
+    return [statements] if isinstance(statements, dict) else statements
+
+
+def merge_policy_statement(policy, statement):
+    # Replaces any statement with the same Sid in a single pass over the policy.
+    # Returns False when an identical statement is already present, so the policy doesn't need to be saved.
+    statements = []
+    already_present = False
+    for item in policy_statements(policy):
+        if item.get("Sid") == statement["Sid"]:
+            already_present = already_present or item == statement
+        else:
+            statements.append(item)
+    policy["Statement"] = [*statements, statement]
+    return not already_present
+
+
+def add_lambda_permission(function_arn, statement_id, rule_arn, source_account):
+    try:
+        # Skip the add when the function's policy already lets this rule invoke it
+        try:
+            response = lambda_client.get_policy(FunctionName=function_arn)
+            existing_policy = json_loads(response.get("Policy") or "{}")
+            for item in policy_statements(existing_policy):
+                if item.get("Sid") == statement_id and item.get("Condition", {}).get("ArnLike", {}).get("AWS:SourceArn") == rule_arn:
+                    return POLICY_CURRENT
+        except lambda_client.exceptions.ResourceNotFoundException:
+            pass # The function has no resource policy yet
+
+        return lambda_client.add_permission(
+            FunctionName=function_arn,
+            StatementId=statement_id,
+            Action="lambda:InvokeFunction",
+            Principal="events.amazonaws.com",
+            SourceAccount=source_account,
+            SourceArn=rule_arn
+        )
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceConflictException':
+            return None
+        else:
+            raise e
+
+
+def add_sns_permission(topic_arn):
+    try:
+        statement_to_add = {**SNS_BASE_STATEMENT, "Resource": topic_arn}
+        # Get the current policy
+        response = sns_client.get_topic_attributes(
+            TopicArn=topic_arn
+        )
+        # Format the policy with the new statement (as needed)
+        existing_policy = json_loads(response.get("Attributes", {}).get("Policy") or "{}")
+        if not merge_policy_statement(existing_policy, statement_to_add):
+            return POLICY_CURRENT
+        # Save the modified policy
+        return sns_client.set_topic_attributes(
+            TopicArn=topic_arn,
+            AttributeName='Policy',
+            AttributeValue=json_dumps(existing_policy)
+        )
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceConflictException':
+            return None
+        else:
+            raise e
+
+
+def get_queue_url(queue_arn):
+    # Figure out the queue url from the arn
+    queue_name = queue_arn.rsplit(":", 1)[1]
+    response = sqs_client.get_queue_url(
+        QueueName=queue_name
+    )
+    return response.get("QueueUrl")
+
+
+def add_sqs_permission(queue_arn, queue_url, base_statement):
+    try:
+        statement_to_add = {**base_statement, "Resource": queue_arn}
+        # Get the current queue policy
+        response = sqs_client.get_queue_attributes(
+            QueueUrl=queue_url,
+            AttributeNames=['Policy']
+        )
+        # Format the policy with the new statement
+        existing_policy = json_loads(response.get("Attributes", {}).get("Policy") or "{}")
+        if not merge_policy_statement(existing_policy, statement_to_add):
+            return POLICY_CURRENT
+
+        formatted_attributes = {
+            "Policy": json_dumps(existing_policy)
+        }
+        # Set the modified policy on the sqs queue
+        return sqs_client.set_queue_attributes(
+            QueueUrl=queue_url,
+            Attributes=formatted_attributes
+        )
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceConflictException':
+            return None
+        else:
+            raise e